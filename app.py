@@ -1,235 +1,1058 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_file, after_this_request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
 from pydub import AudioSegment
-from pydub.silence import detect_nonsilent, split_on_silence
+from pydub.audio_segment import read_wav_audio
+from pydub.exceptions import CouldntDecodeError
+from celery import Celery
+import redis
+import numpy as np
+from numba import njit
+import soundfile as sf
 import os
+import sys
+import json
+import shutil
+import hashlib
+import io
+import zipfile
+import subprocess
 import tempfile
+from pathlib import PurePosixPath
 import logging
+from logging.handlers import WatchedFileHandler
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import threading
+from functools import lru_cache
+import time
+import unicodedata
+from urllib.parse import quote
 import uuid
 
-# Configure logging
+# Configure logging (set LOG_LEVEL=INFO for per-request detail). gunicorn and Celery worker
+# processes all append to the same file, so rotation is left to logrotate; the handler reopens the
+# file once it has been moved
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get('LOG_LEVEL', 'WARNING').upper(),
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler('silence_cutter.log')
+        WatchedFileHandler('silence_cutter.log', delay=True)
     ]
 )
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Job storage (same pattern as Claude API)
-jobs = {}
+# Async jobs run on Celery workers and need a Redis broker; without one, ?async=true is rejected.
+# Workers: celery -A app.celery_app worker --concurrency=<ncpu>
+# Temp file cleanup: celery -A app.celery_app beat
+REDIS_URL = os.environ.get('REDIS_URL')
+celery_app = Celery('silence_cutter', broker=REDIS_URL, backend=REDIS_URL)
+celery_app.conf.task_track_started = True
+
+# Job records and temp files expire after an hour
+JOB_TTL = 3600
+
+# Job storage (same pattern as Claude API): Redis hashes shared by all workers
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else None
+
+# Uploads and outputs live here so abandoned files can be swept
+UPLOAD_FOLDER = os.path.abspath(os.environ.get('UPLOAD_FOLDER', 'temp_uploads'))
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+# Processed results keyed by upload content and silence settings, kept for a day after last use
+CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'cache')
+os.makedirs(CACHE_FOLDER, exist_ok=True)
+CACHE_TTL = 24 * 3600
+
+# The cache is also capped at this many bytes (1GB), evicting the least recently used results first
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+
+# Request handlers sweep expired files at most this often, for deployments without Celery beat
+CLEANUP_INTERVAL = 900
+_last_cleanup = 0.0
+
+# Internal nginx location aliased to CACHE_FOLDER (e.g. /internal-audio/); when set, cached results
+# are sent with X-Accel-Redirect so nginx serves the bytes instead of a worker
+ACCEL_REDIRECT_PREFIX = os.environ.get('ACCEL_REDIRECT_PREFIX')
 
 # File size limit in bytes (50MB)
 MAX_FILE_SIZE = 50 * 1024 * 1024
 
-def cut_silence(audio_path, min_silence_len=45, silence_thresh=-45, keep_silence=30):
-    logger.info(f"Processing audio file: {audio_path}")
-    logger.info(f"Parameters: min_silence_len={min_silence_len}ms, silence_thresh={silence_thresh}dB, keep_silence={keep_silence}ms")
+# Upload limit in bytes (100MB), for the whole request and for each file
+MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
+
+# Uploads are copied to disk in 1MB blocks
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Uploads decoded in-process stay in memory up to this size (10MB)
+SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+# Silence removal parameters shared by both backends and reported by GET /
+MIN_SILENCE_LEN = 45  # ms
+SILENCE_THRESH = -45  # dBFS
+KEEP_SILENCE = 30  # ms
+SEEK_STEP = 10  # ms, pydub backend only
+
+# Silence removal backend: 'ffmpeg' (silenceremove filter) or 'pydub' (decode + compiled scan)
+SILENCE_BACKEND = os.environ.get('SILENCE_BACKEND', 'ffmpeg')
+
+# Top-level boxes an ISO BMFF file (mp4, m4a, mov, 3gp) starts with; these containers can keep
+# their index at the end of the file, so ffmpeg has to seek in them
+ISOBMFF_BOXES = frozenset({b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip'})
+
+# ffmpeg input that reads stdin through the cache: protocol with unlimited read-ahead, which keeps
+# piped input seekable
+SEEKABLE_PIPE_INPUT = ("-read_ahead_limit", "-1", "-i", "cache:pipe:0")
+
+# Approximate sample rate the silence scan decimates to
+DETECTION_FRAME_RATE = 8000
+
+# Constant bitrates tried for MP3 export (kbps), highest first
+MP3_BITRATES = [256, 192, 160, 128, 96, 64, 48, 32, 24]
+
+def save_job(job_id, job):
+    key = f"job:{job_id}"
+    redis_client.hset(key, mapping=job)
+    redis_client.expire(key, JOB_TTL)
+
+def update_job(job_id, **fields):
+    redis_client.hset(f"job:{job_id}", mapping=fields)
+
+def get_job(job_id):
+    if not redis_client:
+        return None
+    return redis_client.hgetall(f"job:{job_id}") or None
+
+def delete_job(job_id):
+    redis_client.delete(f"job:{job_id}")
+
+def list_jobs():
+    if not redis_client:
+        return []
+    return [job for job in (redis_client.hgetall(key) for key in redis_client.scan_iter("job:*")) if job]
+
+def copy_upload(file, dst):
+    """Copy an upload in UPLOAD_CHUNK_SIZE blocks, enforcing MAX_UPLOAD_SIZE even if the headers understate it"""
+    if file.content_length and file.content_length > MAX_UPLOAD_SIZE:
+        raise RequestEntityTooLarge()
+    total = 0
+    while True:
+        block = file.stream.read(UPLOAD_CHUNK_SIZE)
+        if not block:
+            return total
+        total += len(block)
+        if total > MAX_UPLOAD_SIZE:
+            raise RequestEntityTooLarge()
+        dst.write(block)
+
+def save_upload(file):
+    """Copy an upload to a temp file in UPLOAD_FOLDER and return its path"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.wav', dir=UPLOAD_FOLDER) as input_temp:
+        try:
+            copy_upload(file, input_temp)
+        except Exception:
+            os.unlink(input_temp.name)
+            raise
+    return input_temp.name
+
+def spool_upload(file):
+    """Copy an upload into memory, rolling over to an unnamed temp file above SPOOL_MAX_SIZE"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, dir=UPLOAD_FOLDER)
+    try:
+        copy_upload(file, spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def unspool(spool):
+    """Return a spool's data as a BytesIO while it is still in memory, else the spool (now a real file).
+    
+    Servers call fileno() on response files to try sendfile, which rolls an in-memory spool over to disk.
+    """
+    spool.seek(0, os.SEEK_END)
+    if spool.tell() > SPOOL_MAX_SIZE:
+        spool.seek(0)
+        return spool
+    spool.seek(0)
+    data = io.BytesIO(spool.read())
+    spool.close()
+    return data
+
+def split_filename(filename):
+    """Return the stem and lowercase extension of an upload's filename, without any directory part"""
+    name = PurePosixPath(PurePosixPath(filename.replace('\\', '/')).name or 'audio')
+    return name.stem, name.suffix.lstrip('.').lower()
+
+def upload_cache_key(file):
+    """Hash an upload together with the settings that shape the output, then rewind it"""
+    digest = hashlib.blake2b(
+        f"{SILENCE_BACKEND}:{MIN_SILENCE_LEN}:{SILENCE_THRESH}:{KEEP_SILENCE}:{SEEK_STEP}".encode(),
+        digest_size=20
+    )
+    while True:
+        block = file.stream.read(UPLOAD_CHUNK_SIZE)
+        if not block:
+            break
+        digest.update(block)
+    file.stream.seek(0)
+    return digest.hexdigest()
+
+def cached_result(key):
+    """Return the cached WAV for key, marking it as recently used, or None"""
+    path = os.path.join(CACHE_FOLDER, f'{key}.wav')
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def cache_result(key, output):
+    """Store a processed WAV (path or file object) under key; failures only cost the cache entry"""
+    path = os.path.join(CACHE_FOLDER, f'{key}.wav')
+    try:
+        if isinstance(output, str):
+            # Hard link, so the request can still delete its own output file
+            os.link(output, path)
+        else:
+            # Results small enough to stay in memory are cheap to redo, so they aren't written out
+            output.seek(0, os.SEEK_END)
+            if output.tell() <= SPOOL_MAX_SIZE:
+                return
+            output.seek(0)
+            cache_temp = tempfile.NamedTemporaryFile(delete=False, dir=CACHE_FOLDER)
+            try:
+                with cache_temp:
+                    shutil.copyfileobj(output, cache_temp, length=UPLOAD_CHUNK_SIZE)
+                os.replace(cache_temp.name, path)
+            except OSError:
+                # Don't leave a partial copy behind, e.g. when the disk is full
+                os.unlink(cache_temp.name)
+                raise
+    except FileExistsError:
+        return
+    except OSError as e:
+        logger.warning(f"Could not cache result {key}: {str(e)}")
+        return
+    finally:
+        # The caller sends output next, from the start
+        if not isinstance(output, str):
+            output.seek(0)
+    prune_cache()
+
+def prune_cache():
+    """Delete cached results unused for CACHE_TTL, then the least recently used ones over CACHE_MAX_BYTES"""
+    cutoff = time.time() - CACHE_TTL
+    removed = 0
+    entries = []
+    for entry in os.scandir(CACHE_FOLDER):
+        try:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if stat.st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            continue
     
-    # Load the audio file
+    # cached_result touches entries on every hit, so the oldest mtime is the least recently used
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+def set_attachment(response, download_name):
+    """Mark a response as a download, with an ASCII fallback name and an RFC 5987 UTF-8 name like send_file"""
     try:
-        audio = AudioSegment.from_file(audio_path)
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+    return response
+
+def send_result(cache_key, output, download_name):
+    """Send a processed WAV (path or file object), letting nginx serve it when it is cached"""
+    cached_path = cached_result(cache_key) if ACCEL_REDIRECT_PREFIX else None
+    if cached_path:
+        if not isinstance(output, str):
+            output.close()
+        response = Response(mimetype='audio/wav')
+        response.headers['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + os.path.basename(cached_path)
+        return set_attachment(response, download_name)
+    
+    if isinstance(output, str):
+        return set_attachment(send_file(output, mimetype='audio/wav', conditional=True), download_name)
+    return set_attachment(send_file(output, mimetype='audio/wav'), download_name)
+
+def cleanup_temp_files(max_age=JOB_TTL):
+    """Delete files in UPLOAD_FOLDER older than max_age seconds, and prune the result cache"""
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(UPLOAD_FOLDER):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    removed += prune_cache()
+    if removed:
+        logger.info(f"Removed {removed} expired temp files")
+    return removed
+
+def cleanup_temp_files_if_due():
+    """Run cleanup_temp_files at most once per CLEANUP_INTERVAL in this process"""
+    global _last_cleanup
+    now = time.time()
+    if now - _last_cleanup < CLEANUP_INTERVAL:
+        return
+    _last_cleanup = now
+    cleanup_temp_files()
+
+# Cores available to this process, capped so a large host doesn't get an oversized pool
+CPU_COUNT = min(len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1, 8)
+
+# Files in a batch run on threads: ffmpeg does its work in a subprocess and the compiled scan and
+# libsndfile release the GIL. Each gunicorn worker (WEB_CONCURRENCY) gets its share of the cores.
+BATCH_WORKERS = max(1, CPU_COUNT // int(os.environ.get('WEB_CONCURRENCY', 1)))
+EXECUTOR = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+@njit(cache=True, nogil=True)
+def _window_energies(frames, starts, window, out):
+    """Fused downmix and sliding window energy over (n, channels) frames, for ascending window starts"""
+    channels = frames.shape[1]
+    acc = 0.0
+    head = starts[0]
+    tail = starts[0]
+    for i in range(len(starts)):
+        start = starts[i]
+        # Slide the window to [start, start + window), adding and dropping each frame once
+        while head < start + window:
+            v = 0.0
+            for c in range(channels):
+                v += frames[head, c]
+            v /= channels
+            acc += v * v
+            head += 1
+        while tail < start:
+            v = 0.0
+            for c in range(channels):
+                v += frames[tail, c]
+            v /= channels
+            acc -= v * v
+            tail += 1
+        out[i] = acc
+
+@njit(cache=True, nogil=True)
+def _loud_spans(starts, silent, window, n):
+    """Turn per-window silence flags into [start, end) spans of the frames between silences"""
+    spans = np.empty((len(starts) + 1, 2), dtype=np.int64)
+    k = 0
+    loud_start = 0
+    run_end = -1
+    for i in range(len(starts)):
+        if not silent[i]:
+            continue
+        # A silent window ends the loud span before it, unless it overlaps the previous silence
+        start = starts[i]
+        if start > run_end and start > loud_start:
+            spans[k, 0] = loud_start
+            spans[k, 1] = start
+            k += 1
+        run_end = start + window
+        loud_start = run_end
+    
+    if loud_start < n:
+        spans[k, 0] = loud_start
+        spans[k, 1] = n
+        k += 1
+    return spans[:k]
+
+def _detect_nonsilent(samples, frame_rate, channels, min_silence_len, silence_thresh, max_amplitude, seek_step=1):
+    """Return [start, end) frame index pairs of the non-silent ranges in interleaved samples"""
+    frames = samples.reshape(-1, channels)
+    n_frames = len(frames)
+    
+    # Decoders hand over bytes or bytearrays; scan a read-only view either way, since Numba
+    # compiles separately for writable arrays
+    frames.flags.writeable = False
+    
+    # The silence envelope only needs a few hundred Hz of resolution, so scan every
+    # `step`-th frame (about DETECTION_FRAME_RATE) and map the edges back afterwards
+    step = max(1, frame_rate // DETECTION_FRAME_RATE)
+    frames = frames[::step]
+    n_scan = len(frames)
+    window = max(1, frame_rate // step * min_silence_len // 1000)
+    hop = min(window, max(1, frame_rate // step * seek_step // 1000))
+    
+    # Too short to contain a full silence window, everything is kept
+    if n_scan < window:
+        return np.array([[0, n_frames]], dtype=np.int64)
+    
+    # Windows are compared on total energy, so scale the dBFS threshold by the window length
+    thr = (10 ** (silence_thresh / 20) * max_amplitude) ** 2 * window
+    
+    # Check a window every `hop` frames, always including the last one like pydub does
+    starts = np.arange(0, n_scan - window + 1, hop)
+    if starts[-1] != n_scan - window:
+        starts = np.append(starts, n_scan - window)
+    energies = np.empty(len(starts))
+    _window_energies(frames, starts, window, energies)
+    spans = _loud_spans(starts, energies < thr, window, n_scan)
+    return np.minimum(spans * step, n_frames)
+
+# Compile the scan for 16-bit audio (or load it from Numba's on-disk cache) at import, so the first
+# request doesn't pay for it; with gunicorn's preload_app this happens once, in the master. Numba
+# compiles per array layout: rates of 16kHz and up are decimated to a strided view, lower rates are
+# scanned as-is (contiguous), so both are warmed
+try:
+    for warmup_rate in (44100, DETECTION_FRAME_RATE):
+        _detect_nonsilent(np.zeros(warmup_rate, dtype=np.int16), warmup_rate, 1, MIN_SILENCE_LEN, SILENCE_THRESH, 32768, SEEK_STEP)
+except Exception as e:
+    logger.warning(f"Could not pre-compile the silence scan: {str(e)}")
+
+def read_soundfile(audio_file):
+    """Decode with libsndfile into one preallocated buffer; None if libsndfile can't read the format"""
+    if not isinstance(audio_file, str):
+        audio_file.seek(0)
+    try:
+        f = sf.SoundFile(audio_file)
+    except sf.LibsndfileError:
+        return None
+    
+    with f:
+        # libsndfile doesn't scale float samples to integers, so float sources go to ffmpeg
+        if f.subtype in ('FLOAT', 'DOUBLE'):
+            return None
+        # Keep the resolution of 24/32-bit sources, like pydub's 32-bit decode
+        dtype = 'int16' if f.subtype in ('PCM_S8', 'PCM_U8', 'PCM_16', 'VORBIS', 'MPEG_LAYER_III') else 'int32'
+        # Decode into the bytes the AudioSegment keeps, trimming in place if fewer frames arrive
+        frame_width = np.dtype(dtype).itemsize * f.channels
+        data = bytearray(f.frames * frame_width)
+        frames_read = f.buffer_read_into(np.frombuffer(data, dtype=dtype).reshape(-1, f.channels), dtype=dtype)
+        del data[frames_read * frame_width:]
+    return AudioSegment(
+        data,
+        sample_width=frame_width // f.channels,
+        frame_rate=f.samplerate,
+        channels=f.channels
+    )
+
+def read_ffmpeg(audio_file):
+    """Decode anything ffmpeg reads to 16-bit PCM in a single subprocess, without pydub's ffprobe pass"""
+    if isinstance(audio_file, str):
+        # ffmpeg reads the file straight from the page cache
+        input_args, stdin_data = ["-i", audio_file], None
+    else:
+        # Keep piped input seekable for containers with the index at the end, like m4a
+        audio_file.seek(0)
+        input_args, stdin_data = SEEKABLE_PIPE_INPUT, audio_file.read()
+    command = [
+        AudioSegment.converter, "-hide_banner", "-loglevel", "error",
+        *input_args,
+        "-vn", "-acodec", "pcm_s16le", "-f", "wav", "-"
+    ]
+    
+    proc = subprocess.run(command, input=stdin_data, capture_output=True)
+    if proc.returncode != 0 or not proc.stdout:
+        raise CouldntDecodeError(f"ffmpeg decoding failed: {proc.stderr.decode(errors='replace').strip()}")
+    
+    # Sizes in a piped WAV header are placeholders; read_wav_audio takes everything after 'data'
+    wav = read_wav_audio(proc.stdout)
+    return AudioSegment(
+        wav.raw_data,
+        sample_width=wav.bits_per_sample // 8,
+        frame_rate=wav.sample_rate,
+        channels=wav.channels
+    )
+
+def load_audio(audio_file):
+    """Decode an audio file (path or file object) once so the same AudioSegment can be cut and exported"""
+    logger.info(f"Loading audio file: {audio_file if isinstance(audio_file, str) else 'in-memory upload'}")
+    try:
+        # libsndfile reads WAV/FLAC/OGG/MP3 in-process; anything else (m4a, aac, ...) goes to ffmpeg
+        audio = read_soundfile(audio_file)
+        if audio is None:
+            audio = read_ffmpeg(audio_file)
         logger.info(f"Audio loaded successfully. Duration: {len(audio)/1000:.2f} seconds")
+        return audio
     except Exception as e:
         logger.error(f"Error loading audio file: {str(e)}")
         raise
+
+def cut_silence(audio, min_silence_len=MIN_SILENCE_LEN, silence_thresh=SILENCE_THRESH, keep_silence=KEEP_SILENCE, seek_step=SEEK_STEP):
+    """Remove silences longer than min_silence_len, keeping keep_silence ms of padding around speech.
     
-    # Split audio on silence, keeping short silences as padding
+    Silence windows are checked every seek_step ms. Larger steps make the scan cheaper but can move
+    cut points by up to seek_step ms; 10ms is well under the default padding.
+    
+    Returns (segment, was_modified); was_modified is False when the original audio is returned unchanged.
+    """
+    logger.info(f"Processing audio: {len(audio)/1000:.2f} seconds")
+    logger.info(f"Parameters: min_silence_len={min_silence_len}ms, silence_thresh={silence_thresh}dB, keep_silence={keep_silence}ms")
+    
+    # Find non-silent ranges, keeping short silences as padding
     try:
-        chunks = split_on_silence(
-            audio,
-            min_silence_len=min_silence_len,
-            silence_thresh=silence_thresh,
-            keep_silence=keep_silence
+        samples = np.frombuffer(audio.raw_data, dtype=audio.array_type)
+        spans = _detect_nonsilent(
+            samples,
+            audio.frame_rate,
+            audio.channels,
+            min_silence_len,
+            silence_thresh,
+            audio.max_possible_amplitude,
+            seek_step
         )
-        if not chunks:
+        if len(spans) == 0:
             logger.warning("No audio chunks found after splitting on silence, returning original audio.")
-            return audio
-            
-        logger.info(f"Found {len(chunks)} chunks after splitting on silence.")
+            return audio, False
+        
+        # Pad each range and split overlapping padding in the middle, like pydub's split_on_silence
+        keep = audio.frame_rate * keep_silence // 1000
+        starts = spans[:, 0] - keep
+        ends = spans[:, 1] + keep
+        overlap = starts[1:] < ends[:-1]
+        middle = (ends[:-1] + starts[1:]) // 2
+        ends[:-1][overlap] = middle[overlap]
+        starts[1:][overlap] = middle[overlap]
+        n_frames = len(samples) // audio.channels
+        starts = np.clip(starts, 0, n_frames)
+        ends = np.clip(ends, 0, n_frames)
+        
+        if len(spans) == 1 and starts[0] == 0 and ends[0] == n_frames:
+            logger.info("No silence to remove, returning original audio.")
+            return audio, False
+        
+        logger.info(f"Found {len(spans)} chunks after splitting on silence.")
     except Exception as e:
         logger.error(f"Error splitting audio on silence: {str(e)}")
         raise
     
-    # Combine all chunks
+    # Combine all chunks with a single join over views of the decoded bytes; join sizes the
+    # output once, and the byte offsets are computed in one pass as plain ints
     try:
-        result = AudioSegment.empty()
-        for chunk in chunks:
-            result += chunk
+        raw = memoryview(audio.raw_data)
+        byte_ranges = (np.stack([starts, ends], axis=1) * audio.frame_width).tolist()
+        result = audio._spawn(b"".join([raw[start:end] for start, end in byte_ranges]))
         logger.info(f"Processed audio duration: {len(result)/1000:.2f} seconds")
-        return result
+        return result, True
     except Exception as e:
         logger.error(f"Error combining audio chunks: {str(e)}")
         raise
 
-def export_mp3_with_size_limit(audio, output_path, max_size_bytes=MAX_FILE_SIZE):
-    """Export audio as MP3 with automatic compression to stay under size limit"""
+def is_wav(audio_file):
+    """Check for a RIFF/WAVE header in a path or seekable file object"""
+    if isinstance(audio_file, str):
+        with open(audio_file, 'rb') as f:
+            header = f.read(12)
+    else:
+        audio_file.seek(0)
+        header = audio_file.read(12)
+    return header[:4] == b'RIFF' and header[8:12] == b'WAVE'
+
+def is_isobmff(file):
+    """Check an upload for an MP4-family header, whatever its filename says, then rewind it"""
+    header = file.stream.read(8)
+    file.stream.seek(0)
+    return header[4:8] in ISOBMFF_BOXES
+
+@lru_cache(maxsize=None)
+def silenceremove_args(thresh_db, min_silence_ms, keep_ms):
+    """ffmpeg arguments between the input and the output path, built once per parameter set"""
+    audio_filter = (
+        f"silenceremove=stop_periods=-1"
+        f":stop_duration={min_silence_ms / 1000}"
+        f":stop_threshold={thresh_db}dB"
+        f":stop_silence={keep_ms / 1000}"
+    )
+    return ("-af", audio_filter, "-threads", "0", "-f", "wav")
+
+def silenceremove_command(input_args, out_path, thresh_db=SILENCE_THRESH, min_silence_ms=MIN_SILENCE_LEN, keep_ms=KEEP_SILENCE):
+    """Build the ffmpeg command line that removes silence from the input in input_args into out_path"""
+    return [
+        AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-y",
+        "-threads", "0",
+        *input_args,
+        *silenceremove_args(thresh_db, min_silence_ms, keep_ms),
+        out_path
+    ]
+
+def cut_silence_ffmpeg(in_path, out_path, thresh_db=SILENCE_THRESH, min_silence_ms=MIN_SILENCE_LEN, keep_ms=KEEP_SILENCE):
+    """Remove silence with ffmpeg's silenceremove filter in a single decode/filter/encode pass"""
+    logger.info(f"Processing audio file with ffmpeg: {in_path}")
+    logger.info(f"Parameters: min_silence_len={min_silence_ms}ms, silence_thresh={thresh_db}dB, keep_silence={keep_ms}ms")
+    
+    command = silenceremove_command(["-i", in_path], out_path, thresh_db, min_silence_ms, keep_ms)
+    
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"ffmpeg silence removal failed: {e.stderr.decode(errors='replace').strip()}")
+        raise
+    
+    logger.info(f"Wrote processed audio to: {out_path}")
+    return out_path
+
+def cut_silence_ffmpeg_upload(file, out_path, thresh_db=SILENCE_THRESH, min_silence_ms=MIN_SILENCE_LEN, keep_ms=KEEP_SILENCE):
+    """Like cut_silence_ffmpeg, but feeds the upload to ffmpeg's stdin instead of saving it first"""
+    logger.info(f"Processing upload with ffmpeg: {file.filename}")
+    logger.info(f"Parameters: min_silence_len={min_silence_ms}ms, silence_thresh={thresh_db}dB, keep_silence={keep_ms}ms")
+    
+    # MP4-family input may need seeking, so ffmpeg buffers it; everything else streams straight through
+    input_args = SEEKABLE_PIPE_INPUT if is_isobmff(file) else ["-i", "pipe:0"]
+    command = silenceremove_command(input_args, out_path, thresh_db, min_silence_ms, keep_ms)
+    
+    # stderr goes to a file so a chatty ffmpeg can't fill the pipe and stall while we write stdin
+    with tempfile.TemporaryFile(dir=UPLOAD_FOLDER) as stderr:
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            copy_upload(file, proc.stdin)
+            proc.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg gave up on the input; its exit status and stderr say why
+            pass
+        except Exception:
+            proc.kill()
+            proc.wait()
+            raise
+        
+        if proc.wait() != 0:
+            stderr.seek(0)
+            logger.error(f"ffmpeg silence removal failed: {stderr.read().decode(errors='replace').strip()}")
+            raise subprocess.CalledProcessError(proc.returncode, command)
+    
+    logger.info(f"Wrote processed audio to: {out_path}")
+    return out_path
+
+def mp3_source_kbps(path):
+    """Standard MP3 bitrate matching an MP3 source's average bitrate, or None for other formats"""
+    try:
+        info = sf.info(path)
+    except sf.LibsndfileError:
+        return None
+    if info.format != 'MP3' or info.duration <= 0:
+        return None
+    
+    # Round up to a standard rate, ignoring ~5% of frame headers and tags in the file size
+    average_kbps = os.path.getsize(path) * 8 / info.duration / 1000 * 0.95
+    return min((b for b in MP3_BITRATES if b >= average_kbps), default=MP3_BITRATES[0])
+
+def export_mp3_with_size_limit(audio, output_path, max_size_bytes=MAX_FILE_SIZE, max_kbps=None):
+    """Export audio as MP3 at the highest bitrate that fits the size limit, computed from the duration"""
     logger.info(f"Exporting audio to MP3 format with max size: {max_size_bytes/1024/1024:.1f}MB")
     
-    # Start with high quality and reduce if needed
-    bitrates = [256, 192, 160, 128, 96, 64, 32]  # kbps
+    # Highest bitrate that fits, keeping 5% headroom for frame and tag overhead
+    duration_s = max(len(audio) / 1000.0, 0.001)
+    target_kbps = int(max_size_bytes * 8 / duration_s / 1000 * 0.95)
+    if max_kbps:
+        target_kbps = min(target_kbps, max_kbps)
+    bitrates = [b for b in MP3_BITRATES if b <= target_kbps] or MP3_BITRATES[-1:]
     
-    for bitrate in bitrates:
-        temp_path = output_path + f"_temp_{bitrate}.mp3"
+    # Encode once, with a single retry at the next lower bitrate if the encoder overshoots
+    for bitrate in bitrates[:2]:
         try:
-            # Export with current bitrate
             audio.export(
-                temp_path, 
+                output_path, 
                 format="mp3", 
+                codec="libmp3lame",
                 bitrate=f"{bitrate}k",
-                parameters=["-q:a", "2"]  # Good quality
+                parameters=["-compression_level", "2", "-abr", "0"]  # True CBR, good quality
             )
-            
-            # Check file size
-            file_size = os.path.getsize(temp_path)
-            logger.info(f"Bitrate {bitrate}kbps produced file size: {file_size/1024/1024:.2f}MB")
-            
-            if file_size <= max_size_bytes:
-                # File is within size limit, rename to final output
-                os.rename(temp_path, output_path)
-                logger.info(f"Successfully exported MP3 at {bitrate}kbps bitrate, size: {file_size/1024/1024:.2f}MB")
-                return output_path
-            else:
-                # File too large, try next lower bitrate
-                os.unlink(temp_path)
-                
         except Exception as e:
             logger.error(f"Error exporting at {bitrate}kbps: {str(e)}")
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            continue
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+            raise
+        
+        file_size = os.path.getsize(output_path)
+        if file_size <= max_size_bytes:
+            logger.info(f"Successfully exported MP3 at {bitrate}kbps bitrate, size: {file_size/1024/1024:.2f}MB")
+            return output_path
+        logger.warning(f"Bitrate {bitrate}kbps overshot the size limit: {file_size/1024/1024:.2f}MB")
     
-    # If we get here, even the lowest bitrate was too large
-    # Try one more time with extreme compression
+    os.unlink(output_path)
+    raise Exception("Unable to compress audio under 50MB limit")
+
+def process_audio_to_mp3(input_path, output_path):
+    """Cut silence and export as a size-limited MP3, returning the MP3 path"""
+    # Decode once and reuse the segment for cutting and the MP3 export
+    audio = load_audio(input_path)
+    processed_audio, _ = cut_silence(audio)
+    
+    # Export as MP3 with size limit instead of WAV; an MP3 source also caps the bitrate,
+    # since encoding above it only adds bytes
+    output_path = output_path.replace('.wav', '.mp3')  # Change extension to MP3
+    export_mp3_with_size_limit(processed_audio, output_path, max_kbps=mp3_source_kbps(input_path))
+    return output_path
+
+@celery_app.task(name='silence_cutter.process_audio')
+def process_audio_task(input_path, output_path):
+    """Celery task: cut silence and export a size-limited MP3, with the result kept in the Celery backend"""
     try:
-        audio.export(
-            output_path, 
-            format="mp3", 
-            bitrate="24k",
-            parameters=["-q:a", "9"]  # Lowest quality but smallest size
-        )
-        file_size = os.path.getsize(output_path)
-        logger.warning(f"Used extreme compression (24kbps) - final size: {file_size/1024/1024:.2f}MB")
+        output_path = process_audio_to_mp3(input_path, output_path)
+        logger.info(f"Exported processed audio to: {output_path}")
         return output_path
     except Exception as e:
-        logger.error(f"Failed to export even with extreme compression: {str(e)}")
-        raise Exception("Unable to compress audio under 50MB limit")
+        logger.error(f"Error in Celery processing: {str(e)}")
+        for path in (input_path, output_path, output_path.replace('.wav', '.mp3')):
+            if os.path.exists(path):
+                os.unlink(path)
+        raise
+
+@celery_app.task(name='silence_cutter.cleanup_temp_files')
+def cleanup_temp_files_task():
+    return cleanup_temp_files()
+
+celery_app.conf.beat_schedule = {
+    'cleanup-temp-files': {'task': 'silence_cutter.cleanup_temp_files', 'schedule': float(CLEANUP_INTERVAL)}
+}
 
-def process_audio_background(job_id, input_path, output_path):
-    """Background processing function"""
+def process_single_file(input_path, filename):
+    """Remove silence from one saved upload and report the outcome"""
+    output_path = input_path.replace('.wav', '_processed.wav')
+    result = {'filename': filename}
+    
     try:
-        jobs[job_id]['status'] = 'processing'
-        logger.info(f"[{job_id}] Starting background processing")
+        if SILENCE_BACKEND == 'ffmpeg':
+            cut_silence_ffmpeg(input_path, output_path)
+        else:
+            processed_audio, was_modified = cut_silence(load_audio(input_path))
+            # Nothing was cut from a WAV upload: keep its bytes instead of re-encoding them
+            if not was_modified and is_wav(input_path):
+                os.rename(input_path, output_path)
+            else:
+                processed_audio.export(output_path, format="wav")
         
-        # Process the audio (same as before)
-        processed_audio = cut_silence(input_path)
+        result.update({
+            'status': 'success',
+            'output_path': output_path,
+            'output_size_mb': round(os.path.getsize(output_path) / 1024 / 1024, 2)
+        })
+    except Exception as e:
+        logger.error(f"Error processing {filename}: {str(e)}")
+        result.update({'status': 'failed', 'error': str(e)})
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+    finally:
+        if os.path.exists(input_path):
+            os.unlink(input_path)
+    
+    return result
+
+class ZipStreamBuffer:
+    """Write-only file object that collects what zipfile writes until it is drained"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_zip(members, summary):
+    """Yield a ZIP archive of (path, arcname) members plus the processing summary as it is built"""
+    buffer = ZipStreamBuffer()
+    # The buffer can't seek, so zipfile writes data descriptors after each member, and can't go
+    # back to switch a member to ZIP64 once it passes 2GiB; long MP3s decode to WAVs that large.
+    # PCM audio barely deflates, so it is stored as-is and only the summary is compressed.
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        for path, arcname in members:
+            with open(path, 'rb') as src, zf.open(arcname, 'w', force_zip64=True) as dst:
+                while block := src.read(UPLOAD_CHUNK_SIZE):
+                    dst.write(block)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+        zf.writestr('processing_summary.json', json.dumps(summary, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+    yield buffer.drain()
+
+def process_batch(request_id, files):
+    """Process several uploads in parallel and return a ZIP of the results plus a processing summary"""
+    logger.info(f"[{request_id}] Processing batch of {len(files)} files")
+    
+    # Save every upload first so the workers only receive file paths
+    inputs = []
+    try:
+        for file in files:
+            inputs.append((save_upload(file), file.filename))
+    except Exception as e:
+        logger.error(f"[{request_id}] Error saving input files: {str(e)}")
+        for input_path, _ in inputs:
+            os.unlink(input_path)
+        if isinstance(e, RequestEntityTooLarge):
+            raise
+        return jsonify({'error': 'Error saving input file'}), 500
+    
+    futures = [EXECUTOR.submit(process_single_file, input_path, filename) for input_path, filename in inputs]
+    results = []
+    for (input_path, filename), future in zip(inputs, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            # process_single_file reports its own errors; this is the executor failing
+            logger.error(f"[{request_id}] Error processing {filename}: {str(e)}")
+            results.append({'filename': filename, 'status': 'failed', 'error': str(e)})
+            if os.path.exists(input_path):
+                os.unlink(input_path)
+    successful = [r for r in results if r['status'] == 'success']
+    
+    # Name outputs after their uploads, numbering duplicates until the name is free
+    used_names = set()
+    for r in successful:
+        # Member names are sanitized, since unzip tools write them to disk as-is
+        base = secure_filename(split_filename(r['filename'])[0]) or 'audio'
+        name = f'{base}_processed.wav'
+        n = 1
+        while name in used_names:
+            n += 1
+            name = f'{base}_{n}_processed.wav'
+        used_names.add(name)
+        r['output_filename'] = name
+    
+    summary = {
+        'request_id': request_id,
+        'total_files': len(results),
+        'successful': len(successful),
+        'failed': len(results) - len(successful),
+        'results': [{k: v for k, v in r.items() if k != 'output_path'} for r in results]
+    }
+    logger.info(f"[{request_id}] Batch finished: {summary['successful']} succeeded, {summary['failed']} failed")
+    
+    if not successful:
+        return jsonify({'error': 'All files failed to process', 'summary': summary}), 500
+    
+    members = [(r['output_path'], r['output_filename']) for r in successful]
+    response = Response(
+        stream_zip(members, summary),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename=processed_audio_{request_id}.zip'
+        }
+    )
+    
+    # Runs once the response is closed, even if the client disconnects mid-stream
+    @response.call_on_close
+    def _cleanup():
+        for output_path, _ in members:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+    
+    return response
+
+def process_in_memory(request_id, file, download_name, cache_key):
+    """Cut a single upload in-process, decoding small uploads straight from memory"""
+    try:
+        spool = spool_upload(file)
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        logger.error(f"[{request_id}] Error saving input file: {str(e)}")
+        return jsonify({'error': 'Error saving input file'}), 500
+    
+    try:
+        # WAV/FLAC/OGG/MP3 are decoded in-process; other formats are piped to ffmpeg
+        audio = load_audio(spool)
+        processed_audio, was_modified = cut_silence(audio)
         
-        # Export as MP3 with size limit instead of WAV
-        output_path = output_path.replace('.wav', '.mp3')  # Change extension to MP3
-        export_mp3_with_size_limit(processed_audio, output_path)
-        logger.info(f"[{job_id}] Exported processed audio to: {output_path}")
+        # Nothing was cut from a WAV upload: send its bytes back instead of re-encoding them
+        if not was_modified and is_wav(spool):
+            logger.info(f"[{request_id}] No silence removed, returning the uploaded WAV")
+            output = unspool(spool)
+            cache_result(cache_key, output)
+            return send_result(cache_key, output, download_name)
         
-        # Update job status
-        jobs[job_id]['status'] = 'completed'
-        jobs[job_id]['output_path'] = output_path
-        jobs[job_id]['completed_at'] = datetime.now()
-        logger.info(f"[{job_id}] Processing completed successfully")
+        spool.close()
         
+        # Export like the upload was spooled: small results in memory, large ones to a named file
+        # the server can sendfile() and the cache can hard-link
+        if len(processed_audio.raw_data) <= SPOOL_MAX_SIZE:
+            output = io.BytesIO()
+            processed_audio.export(output, format="wav")
+            output.seek(0)
+        else:
+            with tempfile.NamedTemporaryFile(delete=False, suffix='_processed.wav', dir=UPLOAD_FOLDER) as output_temp:
+                output = output_temp.name
+            try:
+                processed_audio.export(output, format="wav")
+            except Exception:
+                os.unlink(output)
+                raise
+            
+            @after_this_request
+            def _cleanup(response):
+                os.unlink(output)
+                return response
+        cache_result(cache_key, output)
     except Exception as e:
-        logger.error(f"[{job_id}] Error in background processing: {str(e)}")
-        jobs[job_id]['status'] = 'failed'
-        jobs[job_id]['error'] = str(e)
-        jobs[job_id]['completed_at'] = datetime.now()
-        
-        # Clean up on error
-        if os.path.exists(input_path):
-            os.unlink(input_path)
-        if os.path.exists(output_path):
-            os.unlink(output_path)
+        logger.error(f"[{request_id}] Error processing audio: {str(e)}")
+        spool.close()
+        return jsonify({'error': f'Processing failed: {str(e)}'}), 500
+    
+    logger.info(f"[{request_id}] Returning WAV file, size: {len(processed_audio.raw_data)/1024/1024:.2f}MB")
+    
+    return send_result(cache_key, output, download_name)
 
 @app.route('/process-audio', methods=['POST'])
 def process_audio():
     request_id = datetime.now().strftime('%Y%m%d_%H%M%S')
     logger.info(f"[{request_id}] Received new request")
     
-    if 'file' not in request.files:
+    if not request.files:
         logger.error(f"[{request_id}] No file provided in request")
         return jsonify({'error': 'No file provided'}), 400
     
-    file = request.files['file']
-    if file.filename == '':
+    # Accept 'file' as well as any other field names, including repeated ones
+    files = [f for key in request.files for f in request.files.getlist(key) if f.filename]
+    if not files:
         logger.error(f"[{request_id}] Empty filename")
         return jsonify({'error': 'No file selected'}), 400
     
+    # ?async=true queues a single file as a job that is polled on /job/<job_id>
+    run_async = request.args.get('async', '').lower() in ('1', 'true', 'yes')
+    if run_async and not REDIS_URL:
+        # Jobs must be visible to every worker that may get the poll, and outlive the worker that queued them
+        logger.error(f"[{request_id}] Async processing requested without REDIS_URL")
+        return jsonify({'error': 'Async processing is not configured on this server'}), 503
+    
+    # Without Celery beat nothing else sweeps old uploads and cached results
+    cleanup_temp_files_if_due()
+    
+    if len(files) > 1:
+        if run_async:
+            return jsonify({'error': 'Async processing accepts a single file'}), 400
+        return process_batch(request_id, files)
+    
+    file = files[0]
     logger.info(f"[{request_id}] Processing file: {file.filename}")
+    base, _ = split_filename(file.filename)
+    download_name = f'{base}_processed.wav'
+    
+    if not run_async:
+        # Identical re-uploads are answered from the result cache
+        cache_key = upload_cache_key(file)
+        cached_path = cached_result(cache_key)
+        if cached_path:
+            logger.info(f"[{request_id}] Returning cached result {cache_key}")
+            return send_result(cache_key, cached_path, download_name)
+        
+        # The pydub backend decodes in-process and ffmpeg reads from a pipe, so the upload
+        # doesn't have to be written to disk first
+        if SILENCE_BACKEND != 'ffmpeg':
+            return process_in_memory(request_id, file, download_name, cache_key)
+        return process_streamed(request_id, file, download_name, cache_key)
     
-    # Create temporary files for input and output
+    # Async jobs run on a Celery worker, which reads the upload from the shared UPLOAD_FOLDER
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as input_temp:
-            file.save(input_temp.name)
-            input_path = input_temp.name
+        input_path = save_upload(file)
         logger.info(f"[{request_id}] Saved input file to: {input_path}")
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         logger.error(f"[{request_id}] Error saving input file: {str(e)}")
         return jsonify({'error': 'Error saving input file'}), 500
     
-    # Output will be WAV to maintain quality
+    # The job writes an MP3 next to this path
     output_path = input_path.replace('.wav', '_processed.wav')
+    return submit_job(request_id, file.filename, input_path, output_path)
+
+def process_streamed(request_id, file, download_name, cache_key):
+    """Process a single upload synchronously by piping it through ffmpeg"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='_processed.wav', dir=UPLOAD_FOLDER) as output_temp:
+        output_path = output_temp.name
     
     try:
-        # Process synchronously (no background thread)
-        logger.info(f"[{request_id}] Starting synchronous processing")
-        
-        # Process the audio
-        processed_audio = cut_silence(input_path)
-        
-        # Export as WAV (high quality)
-        processed_audio.export(output_path, format="wav")
-        logger.info(f"[{request_id}] Exported processed audio to: {output_path}")
-        
-        # Return the processed file directly
-        if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
-            logger.info(f"[{request_id}] Returning WAV file, size: {file_size/1024/1024:.2f}MB")
-            
-            with open(output_path, 'rb') as f:
-                audio_data = f.read()
-            
-            # Clean up files
-            os.unlink(input_path)
-            os.unlink(output_path)
-            
-            return Response(
-                audio_data,
-                mimetype='audio/wav',
-                headers={
-                    'Content-Disposition': f'attachment; filename={file.filename.rsplit(".", 1)[0]}_processed.wav'
-                }
-            )
-        else:
-            logger.error(f"[{request_id}] Processed file not found")
-            return jsonify({'error': 'Processed file not found'}), 500
-            
+        logger.info(f"[{request_id}] Starting streamed processing")
+        cut_silence_ffmpeg_upload(file, output_path)
+        cache_result(cache_key, output_path)
+    except RequestEntityTooLarge:
+        os.unlink(output_path)
+        raise
     except Exception as e:
         logger.error(f"[{request_id}] Error processing audio: {str(e)}")
-        # Clean up on error
-        if os.path.exists(input_path):
-            os.unlink(input_path)
-        if os.path.exists(output_path):
-            os.unlink(output_path)
+        os.unlink(output_path)
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
+    
+    file_size = os.path.getsize(output_path)
+    logger.info(f"[{request_id}] Returning WAV file, size: {file_size/1024/1024:.2f}MB")
+    
+    @after_this_request
+    def _cleanup(response):
+        os.unlink(output_path)
+        return response
+    
+    return send_result(cache_key, output_path, download_name)
+
+def submit_job(request_id, filename, input_path, output_path):
+    """Queue an MP3 processing job and return its id for polling"""
+    job_id = str(uuid.uuid4())
+    job = {
+        'status': 'pending',
+        'filename': filename,
+        'input_path': input_path,
+        'created_at': datetime.now().isoformat()
+    }
+    
+    try:
+        task = process_audio_task.delay(input_path, output_path)
+        job['task_id'] = task.id
+        save_job(job_id, job)
+    except Exception as e:
+        logger.error(f"[{request_id}] Error queueing job: {str(e)}")
+        os.unlink(input_path)
+        return jsonify({'error': 'Async processing is unavailable, try again later'}), 503
+    logger.info(f"[{request_id}] Queued job {job_id}")
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': f'/job/{job_id}'
+    }), 202
+
+def refresh_job_from_task(job_id, job):
+    """Copy the Celery task state into the job record"""
+    result = celery_app.AsyncResult(job['task_id'])
+    if result.state == 'SUCCESS':
+        fields = {'status': 'completed', 'output_path': result.result, 'completed_at': datetime.now().isoformat()}
+    elif result.state == 'FAILURE':
+        fields = {'status': 'failed', 'error': str(result.result), 'completed_at': datetime.now().isoformat()}
+    elif result.state == 'STARTED':
+        fields = {'status': 'processing'}
+    else:
+        return job
+    update_job(job_id, **fields)
+    return {**job, **fields}
 
 @app.route('/job/<job_id>', methods=['GET'])
 def get_job_status(job_id):
-    if job_id not in jobs:
+    job = get_job(job_id)
+    if job is None:
         return jsonify({'error': 'Job not found'}), 404
     
-    job = jobs[job_id]
+    job = refresh_job_from_task(job_id, job)
     
     if job['status'] == 'completed':
         # Return the processed audio file
@@ -238,18 +1061,21 @@ def get_job_status(job_id):
             file_size = os.path.getsize(output_path)
             logger.info(f"Returning MP3 file, size: {file_size/1024/1024:.2f}MB")
             
-            with open(output_path, 'rb') as f:
-                audio_data = f.read()
-            
             # Clean up files after sending
-            os.unlink(job['input_path'])
-            os.unlink(output_path)
-            del jobs[job_id]  # Clean up job
+            @after_this_request
+            def _cleanup(response):
+                os.unlink(job['input_path'])
+                os.unlink(output_path)
+                delete_job(job_id)  # Clean up job
+                return response
             
-            return audio_data, 200, {
-                'Content-Type': 'audio/mpeg',  # Changed to MP3 content type
-                'Content-Disposition': 'attachment; filename=processed_audio.mp3'  # Changed filename extension
-            }
+            return send_file(
+                output_path,
+                mimetype='audio/mpeg',
+                as_attachment=True,
+                download_name='processed_audio.mp3',
+                conditional=True
+            )
         else:
             return jsonify({'error': 'Processed file not found'}), 500
             
@@ -258,7 +1084,7 @@ def get_job_status(job_id):
         # Clean up on failure
         if os.path.exists(job['input_path']):
             os.unlink(job['input_path'])
-        del jobs[job_id]
+        delete_job(job_id)
         return jsonify({'error': error_msg}), 500
     else:
         # Still processing
@@ -266,16 +1092,21 @@ def get_job_status(job_id):
             'job_id': job_id,
             'status': job['status'],
             'filename': job['filename'],
-            'created_at': job['created_at'].isoformat(),
+            'created_at': job['created_at'],
             'message': 'Audio processing in progress...'
         }), 200
 
+@app.errorhandler(413)
+def request_too_large(e):
+    logger.error("Rejected upload over the size limit")
+    return jsonify({'error': f'File too large (max {MAX_UPLOAD_SIZE // 1024 // 1024}MB)'}), 413
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'active_jobs': len([j for j in jobs.values() if j['status'] in ['pending', 'processing']])
+        'active_jobs': len([j for j in list_jobs() if j['status'] in ['pending', 'processing']])
     })
 
 @app.route('/', methods=['GET'])
@@ -287,16 +1118,18 @@ def home():
         'status': 'running',
         'service': 'Audio Silence Cutter',
         'parameters': {
-            'min_silence_len': 45,
-            'silence_thresh': -45,
-            'keep_silence': 23
+            'min_silence_len': MIN_SILENCE_LEN,
+            'silence_thresh': SILENCE_THRESH,
+            'keep_silence': KEEP_SILENCE
         }
     })
 
 if __name__ == '__main__':
-    logger.info("Starting Silence Cutter API server...")
-    # Create upload folder if it doesn't exist
-    os.makedirs('temp_uploads', exist_ok=True)
+    if os.environ.get('FLASK_DEV') != '1':
+        print("Run the server with: gunicorn -c gunicorn.conf.py app:app (set FLASK_DEV=1 for the development server)")
+        sys.exit(1)
+    
+    logger.info("Starting Silence Cutter API development server...")
     
     # Run the app
     port = int(os.environ.get('PORT', 10000))
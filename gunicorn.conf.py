@@ -0,0 +1,21 @@
+import os
+
+# Gunicorn configuration for the Silence Cutter API
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+
+# One worker per core, a few threads each for uploads and downloads
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+# Export the worker count so the app can split the cores between each worker's batch pool
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = 'gthread'
+threads = 4
+
+# Long files can take minutes to process
+timeout = 300
+
+# Recycle workers periodically to bound pydub memory growth
+max_requests = 100
+max_requests_jitter = 10
+
+# Import the app once in the master so workers share its memory copy-on-write
+preload_app = True